@@ -1,10 +1,148 @@
-import json
+import logging
+import orjson
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+from typing import Iterable, Iterator
 from requests import RequestException
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from dateutil.parser import parse
 
 
-from utils import send_post_request, send_get_request, get_string_number
+from utils import send_post_request, send_get_request, get_string_number, create_session, mount_scroll_adapter, load_cache, save_cache
+
+log = logging.getLogger(__name__)
+
+_ISO_INPUT_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S")
+_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+_MILLISECOND = timedelta(milliseconds=1)
+
+# Security event types requested from XC, in the order they are saved
+SEC_EVENT_TYPES = ('waf_sec_event', 'bot_defense_sec_event', 'api_sec_event', 'svc_policy_sec_event')
+_SEC_EVENT_FILTER = 'sec_event_type=~"{}"'.format('|'.join(SEC_EVENT_TYPES))
+_SEC_EVENT_QUERY = '{' + _SEC_EVENT_FILTER + '}'
+
+
+def _parse_date(value: str) -> datetime:
+  """
+  Parse a date string into a naive datetime object.
+
+  The documented input format YYYY-MM-DD[THH:MM:SS] is handled by datetime.fromisoformat / datetime.strptime,
+  which are much faster than dateutil. Only unusual formats fall back to dateutil.parser.parse.
+
+  Parameters:
+  - value (str): The date string to parse.
+
+  Returns:
+  - datetime: The parsed datetime as naive UTC. A UTC offset in the string is applied, not dropped.
+
+  Raises:
+  - ValueError: If the string cannot be parsed as a date.
+  """
+  try:
+    return _to_naive_utc(datetime.fromisoformat(value))
+  except ValueError:
+    pass
+  for date_format in _ISO_INPUT_FORMATS:
+    try:
+      return datetime.strptime(value, date_format)
+    except ValueError:
+      continue
+  return _to_naive_utc(parse(value))
+
+
+def _to_naive_utc(value: datetime) -> datetime:
+  """
+  Convert a timezone-aware datetime to naive UTC. Naive datetimes are already UTC and are returned unchanged.
+
+  Parameters:
+  - value (datetime): The datetime to convert.
+
+  Returns:
+  - datetime: The naive UTC datetime.
+  """
+  if value.tzinfo is None:
+    return value
+  return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _format_datetime(value: datetime, date_format: str) -> str:
+  """
+  Format a datetime with strftime, caching the result for repeated values.
+
+  Timezone-aware datetimes are converted to naive UTC first: the XC dates are UTC ("Z") strings, and
+  aware datetimes of the same instant in different timezones are equal, so they would share a cache entry.
+
+  Parameters:
+  - value (datetime): The datetime to format.
+  - date_format (str): The strftime format.
+
+  Returns:
+  - str: The formatted datetime.
+  """
+  return _format_naive_datetime(_to_naive_utc(value), date_format)
+
+
+@lru_cache(maxsize=1024)
+def _format_naive_datetime(value: datetime, date_format: str) -> str:
+  """
+  Format a naive datetime with strftime, caching the result for repeated values.
+
+  Parameters:
+  - value (datetime): The naive datetime to format.
+  - date_format (str): The strftime format.
+
+  Returns:
+  - str: The formatted datetime.
+  """
+  return value.strftime(date_format)
+
+
+def _format_datetime_ms(value: datetime) -> str:
+  """
+  Format a datetime like _DATETIME_FORMAT, keeping the milliseconds.
+
+  Parameters:
+  - value (datetime): The datetime to format.
+
+  Returns:
+  - str: The formatted datetime.
+  """
+  return _format_datetime(value, "%Y-%m-%dT%H:%M:%S.") + f"{value.microsecond // 1000:03d}Z"
+
+
+@lru_cache(maxsize=1024)
+def _parse_formatted_datetime(value: str, date_format: str) -> datetime:
+  """
+  Parse a datetime string with strptime, caching the result for repeated values.
+
+  Parameters:
+  - value (str): The datetime string to parse.
+  - date_format (str): The strptime format.
+
+  Returns:
+  - datetime: The parsed datetime.
+  """
+  return datetime.strptime(value, date_format)
+
+
+def _decode_events(events: list) -> list:
+  """
+  Decode a page of security events.
+
+  The API returns every event as a JSON encoded string, so the page is joined into a single JSON array
+  and decoded with one orjson call instead of one call per event. Events that are already decoded are
+  returned unchanged.
+
+  Parameters:
+  - events (list): The events of a scroll page.
+
+  Returns:
+  - list: The decoded events.
+  """
+  if not events or not isinstance(events[0], str):
+    return events
+  return orjson.loads('[' + ','.join(events) + ']')
 
 
 class XC:
@@ -12,7 +150,29 @@ class XC:
   Class representing an XC object with its attributes and methods. Used to set up the XC object and retrieve data from the XC API.
   """
 
-  def __init__(self, tenant: str, namespace: str, api_key: str, loadbalancer_name: str | None, start_date: str | datetime, to_date: str | datetime, limit_events: int | None):
+  __slots__ = ('_tenant', '_namespace', '_api_key', '_loadbalancer_name', '_limit_events', '_to_date', '_start_date',
+               '_cache_ttl', '_session', '_loadbalancers_url', '_events_url', '_aggregation_url', '_scroll_url_tmpl',
+               '_incomplete_lbs')
+
+  # Number of events returned by each scroll page
+  _PAGE_SIZE = 500
+
+  # Invariant parts of the API request bodies
+  _VH_NAME_AGGREGATION = {
+    'fieldAggregation_VH_NAME_100': {
+      'field_aggregation': {
+        'field': 'VH_NAME',
+        'topk': 100
+      }
+    }
+  }
+  _EVENTS_REQUEST_TEMPLATE = {
+    "aggs": {},
+    "scroll": True
+  }
+
+  def __init__(self, tenant: str, namespace: str, api_key: str, loadbalancer_name: str | None, start_date: str | datetime, to_date: str | datetime, limit_events: int | None,
+               cache_ttl: int = 0):
     """
     Initializes a new instance of the class XC.
 
@@ -24,26 +184,55 @@ class XC:
       - start_date (str | datetime): The start date of the events range.
       - to_date (str | datetime): The end date of the events range.
       - limit_events (int | None): The maximum number of events to retrieve, or 0 if None.
+      - cache_ttl (int, optional): Seconds the load balancers and virtual hostnames are cached on disk, or 0 to disable the cache. Defaults to 0.
     """
     self._tenant = tenant
     self._namespace = namespace
     self._api_key = api_key
     self._loadbalancer_name = loadbalancer_name or 'all'
     self._limit_events = limit_events or 0
-    self.__DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+    self._cache_ttl = cache_ttl
+    self._incomplete_lbs = set()
     try:
-      if type(to_date) is datetime:
-        self._to_date = to_date.strftime(self.__DATETIME_FORMAT)
+      if isinstance(to_date, datetime):
+        self._to_date = _format_datetime(to_date, _DATETIME_FORMAT)
       else:
-        self._to_date = parse(to_date, ignoretz=True).strftime(self.__DATETIME_FORMAT)
-      if type(start_date) is datetime:
-        self._start_date = start_date.strftime(self.__DATETIME_FORMAT)
+        self._to_date = _format_datetime(_parse_date(to_date), _DATETIME_FORMAT)
+      if isinstance(start_date, datetime):
+        self._start_date = _format_datetime(start_date, _DATETIME_FORMAT)
       else:
-        self._start_date = parse(start_date, ignoretz=True).strftime(self.__DATETIME_FORMAT)
+        self._start_date = _format_datetime(_parse_date(start_date), _DATETIME_FORMAT)
     except ValueError:
       raise ValueError("Invalid from date format, should be YYYY-MM-DD[THH:MM:SS]. Exiting...")
     except Exception as e:
       raise Exception(f'Generic Error during class init: {e}')
+    self._session = create_session()
+    self._build_urls()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, type, value, traceback):
+    self.close()
+
+  def _build_urls(self):
+    """
+    Build the API URLs for the current tenant and namespace.
+
+    The scroll requests get their own adapter, which does not retry read errors.
+    """
+    base_url = f'https://{self._tenant}.console.ves.volterra.io/api'
+    self._loadbalancers_url = f'{base_url}/config/namespaces/{self._namespace}/http_loadbalancers'
+    self._events_url = f'{base_url}/data/namespaces/{self._namespace}/app_security/events'
+    self._aggregation_url = f'{self._events_url}/aggregation'
+    self._scroll_url_tmpl = self._events_url + '/scroll?scroll_id={}'
+    mount_scroll_adapter(self._session, self._events_url + '/scroll')
+
+  def close(self):
+    """
+    Close the HTTP session and release its pooled connections.
+    """
+    self._session.close()
 
   @property
   def tenant(self) -> str:
@@ -115,6 +304,16 @@ class XC:
     """
     return self._limit_events
 
+  @property
+  def incomplete_lbs(self) -> list:
+    """
+    Get the load balancers whose events could not be extracted completely.
+
+    Returns:
+      list: The load balancer names, sorted.
+    """
+    return sorted(self._incomplete_lbs)
+
   def get_to_date_datetime(self) -> datetime:
     """
     Get the end date as a datetime object.
@@ -122,7 +321,7 @@ class XC:
     Returns:
       datetime: The end date as a datetime object.
     """
-    return datetime.strptime(self._to_date, self.__DATETIME_FORMAT)
+    return _parse_formatted_datetime(self._to_date, _DATETIME_FORMAT)
 
   def get_start_date_datetime(self) -> datetime:
     """
@@ -131,7 +330,7 @@ class XC:
     Returns:
       datetime: The start date as a datetime object.
     """
-    return datetime.strptime(self._start_date, self.__DATETIME_FORMAT)
+    return _parse_formatted_datetime(self._start_date, _DATETIME_FORMAT)
 
   @tenant.setter
   def set_tenant(self, tenant: str):
@@ -142,6 +341,7 @@ class XC:
       tenant (str): The tenant.
     """
     self._tenant = tenant
+    self._build_urls()
 
   @namespace.setter
   def set_namespace(self, namespace: str):
@@ -152,6 +352,7 @@ class XC:
       namespace (str): The namespace.
     """
     self._namespace = namespace
+    self._build_urls()
 
   @loadbalancer_name.setter
   def set_loadbalancer_name(self, loadbalancer_name: str):
@@ -210,7 +411,7 @@ class XC:
     Args:
       datetime_to_date (datetime): The end date as a datetime object.
     """
-    self._to_date = datetime_to_date.strftime(self.__DATETIME_FORMAT)
+    self._to_date = _format_datetime(datetime_to_date, _DATETIME_FORMAT)
 
   def set_start_date_from_datetime(self, datetime_start_date: datetime):
     """
@@ -219,17 +420,16 @@ class XC:
     Args:
       datetime_start_date (datetime): The start date as a datetime object.
     """
-    self._start_date = datetime_start_date.strftime(self.__DATETIME_FORMAT)
+    self._start_date = _format_datetime(datetime_start_date, _DATETIME_FORMAT)
 
   # Methods
 
-  def get_virtual_hostname(self, lbs: list, verbose: bool = False) -> list:
+  def get_virtual_hostname(self, lbs: list) -> list:
     """
       Retrieves Virtual Hostname values from aggregated security events.
 
       Parameters:
       - lbs (list): A list of load balancers.
-      - verbose (bool, optional): A boolean value to enable/disable verbose mode. Defaults to False.
 
       Returns:
       - List[str]: A list of Virtual Hostnames that match LBs name.
@@ -240,49 +440,65 @@ class XC:
       - Exception: If an unexpected error occurs.
     """
 
-    url = f'https://{self.tenant}.console.ves.volterra.io/api/data/namespaces/{self.namespace}/app_security/events/aggregation'
-    if verbose:
-      print("Execute API calls to retrieve LBs VH_NAME")
+    # The matched VHs depend on the LBs and on the events range. The default range moves with the current time,
+    # so its dates are rounded down to the cache validity: the runs of the same period share the cached VHs
+    lb_names = sorted({lb['name'] for lb in lbs}, key=lambda name: (-len(name), name))
+    ttl = max(self._cache_ttl, 1)
+    range_key = '|'.join(
+      str(int(date.replace(tzinfo=timezone.utc).timestamp()) // ttl)
+      for date in (self.get_start_date_datetime(), self.get_to_date_datetime())
+    )
+    cache_key = f'vh_name|{self.tenant}|{self.namespace}|{self.api_key}|{range_key}|{",".join(lb_names)}'
+    cached_vh_name = load_cache(cache_key, self._cache_ttl)
+    if cached_vh_name:
+      log.debug("Use cached LBs VH_NAME")
+      return cached_vh_name
+
+    log.debug("Execute API calls to retrieve LBs VH_NAME")
 
     # Construct the request body
     requestBody = {
         'namespace': self.namespace,
-        'query': '{sec_event_type=~"waf_sec_event|bot_defense_sec_event|api_sec_event|svc_policy_sec_event"}',
-        'aggs': {
-          'fieldAggregation_VH_NAME_100': {
-              'field_aggregation': {
-                  'field': 'VH_NAME',
-                  'topk': 100
-              }
-          }
-        },
+        'query': _SEC_EVENT_QUERY,
+        'aggs': self._VH_NAME_AGGREGATION,
         "start_time": self.start_date,
         "end_time": self.to_date,
     }
 
     try:
-      data = send_post_request(url, requestBody, self.api_key, verbose)
-      vh_name = []
-      for vh in data['aggs']['fieldAggregation_VH_NAME_100']['field_aggregation']['buckets']:
-        for lb in lbs:
-          if vh['key'].endswith(lb['name']) and not 'redirect-' + lb['name'] in vh['key'] and vh['key'] not in vh_name:
-            vh_name.append(vh['key'])
+      data = send_post_request(self._aggregation_url, requestBody, self.api_key, session=self._session)
 
-      return vh_name
+      # Longest names first, so a bucket usually matches on the first suffix check
+      redirect_markers = {name: 'redirect-' + name for name in lb_names}
+
+      # A dict keeps the API order while giving O(1) duplicate checks
+      vh_name = {}
+      for vh in data['aggs']['fieldAggregation_VH_NAME_100']['field_aggregation']['buckets']:
+        key = vh['key']
+        if key in vh_name:
+          continue
+        # Only keys containing 'redirect-' need the per-LB redirect marker check
+        is_redirect = 'redirect-' in key
+        for name in lb_names:
+          if key.endswith(name) and not (is_redirect and redirect_markers[name] in key):
+            vh_name[key] = None
+            break
+
+      # An empty result may be transient, it is not replayed from the cache
+      if self._cache_ttl > 0 and vh_name:
+        save_cache(cache_key, list(vh_name))
+      return list(vh_name)
 
     except (RequestException, ValueError, Exception) as e:
       print(f"Error GET Security Events: {e}")
       return []
 
-  def get_all_loadbalancers(self, verbose: bool = False) -> list:
+  def get_all_loadbalancers(self) -> list:
     """
       Retrieves load balancers from a specified URL.
 
       Returns a list of load balancers based on certain conditions.
 
-      Parameters:
-      - verbose (bool, optional): A boolean value to enable/disable verbose mode. Defaults to False.
-
       Returns:
       - list[str]: A list of all load balancers obtained from the JSON response that matches lb_name.
 
@@ -292,117 +508,230 @@ class XC:
       - Exception: If an unexpected error occurs.
     """
 
-    # Get Load Balancers
-    url_lb = f'https://{self.tenant}.console.ves.volterra.io/api/config/namespaces/{self.namespace}/http_loadbalancers'
-
-    if verbose:
-      print("Execute API calls to retrieve LBs")
     try:
-      json_response = send_get_request(url_lb, self.api_key, verbose)
+      cache_key = f'loadbalancers|{self.tenant}|{self.namespace}|{self.api_key}'
+      items = load_cache(cache_key, self._cache_ttl)
+      if items:
+        log.debug("Use cached LBs")
+      else:
+        log.debug("Execute API calls to retrieve LBs")
+        items = send_get_request(self._loadbalancers_url, self.api_key, session=self._session)['items']
+        # An empty result may be transient, it is not replayed from the cache
+        if self._cache_ttl > 0 and items:
+          save_cache(cache_key, items)
 
       if self.loadbalancer_name == 'all':
-        return json_response['items']
-      return [lb for lb in json_response['items'] if lb['name'] == self.loadbalancer_name]
+        return items
+      return [lb for lb in items if lb['name'] == self.loadbalancer_name]
 
     except (RequestException, ValueError, Exception) as e:
       print(f"Error GET Load Balancers: {e}")
       return []
 
-  def get_security_events(self, lb_name: str, scroll_number: int, scroll_id: str | None = None, verbose: bool = False) -> list:
+  def get_security_events(self, lb_name: str, scroll_number: int, scroll_id: str | None = None, windows: int = 1) -> list:
     """
     Retrieves security events for a specified load balancer.
 
+    When windows is greater than 1, the events range is split in that many time windows, each one
+    extracted in parallel with its own (shorter) scroll chain. The events are returned in windows order.
+    The windows are not used when limit_events is set, since the limit applies to a single scroll chain.
+
     Parameters:
     - lb_name (str): The name of the load balancer.
     - scroll_number (int): The scroll number for pagination. Starts from 0.
     - scroll_id (str | None, optional): The scroll ID for fetching subsequent pages. Defaults to None.
-    - verbose (bool, optional): A boolean value to enable/disable verbose mode. Defaults to False.
+    - windows (int, optional): The number of time windows to extract in parallel. Ignored when scroll_id or limit_events is provided. Defaults to 1.
+
+    Returns:
+    - List[Dict[Any]]: A list of security events for the load balancer, limited to limit_events.
+    """
+    if windows <= 1 or scroll_id is not None or self._limit_events:
+      return list(self._iter_security_events(lb_name, scroll_number, scroll_id))
+
+    time_windows = self._split_time_range(windows)
+    with ThreadPoolExecutor(max_workers=len(time_windows)) as executor:
+      futures = [executor.submit(list, self._iter_security_events(lb_name, 0, None, start, end)) for start, end in time_windows]
+      return list(chain.from_iterable(future.result() for future in futures))
+
+  def get_security_events_for_lbs(self, lb_names: Iterable[str], max_workers: int = 8, windows: int = 1) -> Iterator[tuple[str, list]]:
+    """
+    Retrieves security events for several load balancers concurrently.
+
+    Each load balancer has its own independent scroll chain, so the chains run in a thread pool sharing
+    the pooled HTTP session. Results are yielded as soon as each load balancer is completed.
+
+    Parameters:
+    - lb_names (Iterable[str]): The names of the load balancers.
+    - max_workers (int, optional): The maximum number of load balancers fetched at the same time. Defaults to 8.
+    - windows (int, optional): The number of time windows each load balancer is split in. Defaults to 1.
+
+    Yields:
+    - Tuple[str, List[Dict[Any]]]: The load balancer name and its security events.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+      futures = {executor.submit(self.get_security_events, lb_name, 0, None, windows): lb_name for lb_name in lb_names}
+      for future in as_completed(futures):
+        yield futures[future], future.result()
+
+  def _split_time_range(self, windows: int) -> list[tuple[str, str]]:
+    """
+    Splits the events range in contiguous, non-overlapping time windows of the same length.
+
+    The XC range bounds are inclusive, so each window starts one millisecond after the end of the previous
+    one, and an event on a boundary is extracted only once.
+
+    Parameters:
+    - windows (int): The number of time windows.
 
     Returns:
-    - List[Dict[Any]]: A list of security events for the load balancer.
+    - List[Tuple[str, str]]: The start and end date of each time window.
+    """
+    start = self.get_start_date_datetime()
+    step = (self.get_to_date_datetime() - start) / windows
+    if step.total_seconds() < 1:
+      return [(self._start_date, self._to_date)]
+    # Boundaries truncated to the millisecond, the precision of the XC dates
+    boundaries = [start + step * i for i in range(1, windows)]
+    boundaries = [boundary.replace(microsecond=boundary.microsecond // 1000 * 1000) for boundary in boundaries]
+    starts = [self._start_date] + [_format_datetime_ms(boundary + _MILLISECOND) for boundary in boundaries]
+    ends = [_format_datetime_ms(boundary) for boundary in boundaries] + [self._to_date]
+    return list(zip(starts, ends))
 
-    Raises:
-    - requests.RequestException: If an error occurs while making the API request.
-    - ValueError: If there is an issue with the provided parameters or response parsing.
-    - Exception: If an unexpected error occurs.
+  def _fetch_first_page(self, lb_name: str, start_date: str | None = None, to_date: str | None = None) -> dict:
     """
-    obj = []
-    url = f'https://{self.tenant}.console.ves.volterra.io/api/data/namespaces/{self.namespace}/app_security/events'
+    Requests the first page of security events for a specified load balancer, opening a scroll.
 
-    # Construct the URL with scroll ID if provided
-    if scroll_id is not None:
-      url = f'{url}/scroll?scroll_id={scroll_id}'
+    Parameters:
+    - lb_name (str): The name of the load balancer.
+    - start_date (str | None, optional): The start date of the events range. Defaults to the XC start date.
+    - to_date (str | None, optional): The end date of the events range. Defaults to the XC end date.
 
+    Returns:
+    - dict: The API response with total_hits, events and scroll_id.
+    """
     # Construct the request body
     requestBody = {
+        **self._EVENTS_REQUEST_TEMPLATE,
         'namespace': self.namespace,
-        'query': f'{{vh_name="{lb_name}", sec_event_type=~"waf_sec_event|bot_defense_sec_event|api_sec_event|svc_policy_sec_event"}}',
-        "aggs": {},
-        "scroll": True,
-        "limit": self.limit_events if self.limit_events > 0 and self.limit_events < 500 else 500,
-        "start_time": self.start_date,
-        "end_time": self.to_date
+        'query': f'{{vh_name="{lb_name}", {_SEC_EVENT_FILTER}}}',
+        "limit": min(self._limit_events or self._PAGE_SIZE, self._PAGE_SIZE),
+        "start_time": start_date or self.start_date,
+        "end_time": to_date or self.to_date
     }
+    return send_post_request(self._events_url, requestBody, self.api_key, session=self._session)
+
+  def _fetch_next_page(self, scroll_id: str) -> dict:
+    """
+    Requests the next page of security events of an open scroll.
+
+    Parameters:
+    - scroll_id (str): The scroll ID returned by the previous page.
+
+    Returns:
+    - dict: The API response with total_hits, events and scroll_id.
+    """
+    return send_get_request(self._scroll_url_tmpl.format(scroll_id), self.api_key, session=self._session)
+
+  def _iter_security_events(self, lb_name: str, scroll_number: int, scroll_id: str | None = None,
+                            start_date: str | None = None, to_date: str | None = None) -> Iterator[dict]:
+    """
+    Iterates over the security events for a specified load balancer, one scroll page at a time.
+
+    Only the current page is kept in memory. Errors are printed and stop the iteration, so the events
+    already yielded are kept. When fewer events than expected are returned, the load balancer is added
+    to incomplete_lbs.
+
+    Parameters:
+    - lb_name (str): The name of the load balancer.
+    - scroll_number (int): The scroll number for pagination. Starts from 0.
+    - scroll_id (str | None, optional): The scroll ID for fetching subsequent pages. Defaults to None.
+    - start_date (str | None, optional): The start date of the events range. Defaults to the XC start date.
+    - to_date (str | None, optional): The end date of the events range. Defaults to the XC end date.
+
+    Yields:
+    - Dict[Any]: A security event for the load balancer.
+    """
+    effective_limit = self._limit_events or float('inf')
+    events_collected = 0
+    total_events = None
+    # The time windows of a load balancer run in parallel, their messages show the window range
+    label = lb_name if start_date is None else f'{lb_name} [{start_date} - {to_date}]'
 
     try:
-      # Make the API request
-      data = send_post_request(url, requestBody, self.api_key,
-                               verbose) if scroll_id is None else send_get_request(url, self.api_key, verbose)
+      # Make the first API request, continuing from the scroll ID if provided
+      data = self._fetch_first_page(lb_name, start_date, to_date) if scroll_id is None else self._fetch_next_page(scroll_id)
+      # Pages before the provided scroll ID were full pages
+      events_collected = self._PAGE_SIZE * scroll_number
 
+      # The total is the same on every scroll page (and is sent as a string), read it once
       total_hits = int(data['total_hits'])
-      if verbose:
-        print(f"Total Events: {total_hits}")
+      log.debug("Total Events: %d", total_hits)
 
       if total_hits == 0:
-        print(f"No events found for {lb_name}")
-        return []
-
-      if total_hits > 500 and scroll_id is not None:
-        if self.limit_events == 0 or (500 * scroll_number + 500) <= self.limit_events:
-          events_gets_to = len(data['events']) + 500 * scroll_number
-        else:
-          events_gets_to = self.limit_events
-      else:
-        events_gets_to = len(data['events']) if scroll_id is None else len(data['events']) + 500 * scroll_number
-
-      total_events = total_hits if self.limit_events == 0 or total_hits < self.limit_events else self.limit_events
-
-      print(
-        "Request #{}: Got {} events of {} ({:.1f}%) for {}".format(
-          scroll_number + 1,
-          get_string_number(events_gets_to),
-          get_string_number(total_events),
-          round(events_gets_to / total_events * 100, 1),
-          lb_name
-        ))
-
-      # Append each event to the list
-      for event in data['events']:
-        obj.append(json.loads(event))
-
-      # Recursive call if there is a scroll ID present
-      scroll_id = data['scroll_id']
-      if scroll_id != "":
-        next_scroll_num = scroll_number + 1
-        num_events_stored = len(obj) + (500 * scroll_number)
-        if verbose:
-          print(f'Events now: {len(obj)}')
-          print(f"scroll number: {scroll_number}")
-          print(f"Next scroll number: {next_scroll_num}")
-          print(f'Next events: {next_scroll_num * 500}')
-          print(f'Events stored: {num_events_stored}')
-          print(f'Total events: {total_events}')
-        if num_events_stored < total_events:
-          obj_tmp = self.get_security_events(lb_name, next_scroll_num, scroll_id, verbose)
-          obj.extend(obj_tmp)
+        print(f"No events found for {label}")
+        return
+
+      total_events = min(total_hits, effective_limit)
+
+      # The next page is fetched in the background while the current one is decoded
+      with ThreadPoolExecutor(max_workers=1) as executor:
+        while True:
+          events_collected += len(data['events'])
+          events_gets_to = min(events_collected, effective_limit)
+
+          print(
+            "Request #{}: Got {} events of {} ({:.1f}%) for {}".format(
+              scroll_number + 1,
+              get_string_number(events_gets_to),
+              get_string_number(total_events),
+              round(events_gets_to / total_events * 100, 1),
+              label
+            ))
+
+          # Request the next page if there is a scroll ID present and events are still missing
+          scroll_id = data['scroll_id']
+          next_page = None
+          if scroll_id != "":
+            log.debug("Events now: %d", len(data['events']))
+            log.debug("scroll number: %d", scroll_number)
+            log.debug("Next scroll number: %d", scroll_number + 1)
+            log.debug("Events stored: %d", events_collected)
+            log.debug("Total events: %d", total_events)
+            if events_collected < total_events:
+              next_page = executor.submit(self._fetch_next_page, scroll_id)
+
+          # Decode and yield the page events, skipping the ones past the limit
+          page_events = data['events']
+          if events_collected > effective_limit:
+            page_events = page_events[:len(page_events) - (events_collected - effective_limit)]
+          yield from _decode_events(page_events)
+
+          if next_page is None:
+            break
+          data = next_page.result()
+          scroll_number += 1
+
+      # The scroll ended before all the events were returned, a page may have been lost
+      if events_collected < total_events:
+        self._warn_incomplete(lb_name, label, events_collected, total_events)
 
     except (RequestException, ValueError, Exception) as e:
-      # Print error message and return an empty list
-      print(f'Error Exception for LB {lb_name}: {e}')
-      return []
+      # Print error message and stop, the events already yielded are kept
+      print(f'Error Exception for LB {label}: {e}')
+      self._warn_incomplete(lb_name, label, events_collected, total_events)
 
-    if (self.limit_events > 0 and len(obj) > self.limit_events):
-      if verbose:
-        print(f"Limiting events to {self.limit_events}")
-      obj = obj[:self.limit_events]
-    return obj
+  def _warn_incomplete(self, lb_name: str, label: str, events_collected: int, total_events: int | None) -> None:
+    """
+    Print a warning for a load balancer whose events were not extracted completely, and add it to incomplete_lbs.
+
+    Parameters:
+    - lb_name (str): The name of the load balancer.
+    - label (str): The load balancer name, with the time window range when extracted in windows.
+    - events_collected (int): The number of events received.
+    - total_events (int | None): The number of events expected, or None if the first page failed.
+    """
+    self._incomplete_lbs.add(lb_name)
+    if total_events is None:
+      print(f"Warning: got no events for {label}")
+    else:
+      print(f"Warning: got only {get_string_number(events_collected)} of {get_string_number(total_events)} events for {label}")
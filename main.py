@@ -3,7 +3,7 @@ F5 XC Security Event Logs Extraction
 
 This script extracts security events from XC (cross-cloud) and saves the data in either Excel or JSON format. It supports various command-line arguments to customize the extraction process.
 
-usage: main.py [-h] -t TENANT -k API_KEY [-n NAMESPACE] [-l LOADBALANCER] [-d PREVIOUS_DAYS] [--skip-days SKIP_DAYS] [-L LIMIT_EVENTS] [-o OUTPUT] [-j] [-F FROM_DATE] [-T TO_DATE] [-v] [--version]
+usage: main.py [-h] -t TENANT -k API_KEY [-n NAMESPACE] [-l LOADBALANCER] [-d PREVIOUS_DAYS] [--skip-days SKIP_DAYS] [-L LIMIT_EVENTS] [-o OUTPUT] [-j] [-F FROM_DATE] [-T TO_DATE] [-w WORKERS] [--windows WINDOWS] [--no-cache] [-v] [--version]
 
 F5 XC Security Event Logs Extraction. Extract security logs from XC for a given tenant and save them to a JSON or Excel file.
 
@@ -30,6 +30,10 @@ options:
                         From date in format YYYY-MM-DD[THH:MM:SS]
   -T TO_DATE, --to-date TO_DATE
                         To date in format YYYY-MM-DD[THH:MM:SS]
+  -w WORKERS, --workers WORKERS
+                        Number of load balancers to extract in parallel (Default: 8)
+  --windows WINDOWS     Split the time range of each load balancer in this number of windows extracted in parallel, not with --limit-events (Default: 1)
+  --no-cache            Do not use the cached load balancers and virtual hostnames (Default: cached for 10 minutes)
   -v, --verbose         Verbose mode
   --version             Show version
 Examples:
@@ -42,26 +46,17 @@ Note:
 """
 
 import json
+import os
 import sys
+import logging
 import argparse
-from datetime import datetime, timedelta
+import tempfile
+from datetime import datetime, timedelta, timezone
 
 import utils
-from XC import XC
+from XC import XC, SEC_EVENT_TYPES
 
-RECUSION_LIMIT = 5000
-
-
-class recursion_depth:
-  def __init__(self, limit):
-    self.limit = limit
-    self.default_limit = sys.getrecursionlimit()
-
-  def __enter__(self):
-    sys.setrecursionlimit(self.limit)
-
-  def __exit__(self, type, value, traceback):
-    sys.setrecursionlimit(self.default_limit)
+CACHE_TTL = 600
 
 
 def exit_script(exit_code: int = 0) -> None:
@@ -74,6 +69,31 @@ def exit_script(exit_code: int = 0) -> None:
   exit(exit_code)
 
 
+def classify_events(events: list, supported_event_types: tuple) -> dict:
+  """
+  Separate the events in different lists by event type.
+
+  Events with an unsupported type are skipped, printing each unsupported type once.
+
+  Args:
+      events (list): The events to classify.
+      supported_event_types (tuple): The event types to keep.
+
+  Returns:
+      dict: The events of each supported type.
+  """
+  classified = {event_type: [] for event_type in supported_event_types}
+  unsupported_event_types = set()
+  for event in events:
+    event_type = event['sec_event_type']
+    if event_type in classified:
+      classified[event_type].append(event)
+    elif event_type not in unsupported_event_types:
+      unsupported_event_types.add(event_type)
+      print(f"Event type {event_type} not supported")
+  return classified
+
+
 def main() -> None:
   """
     Extracts security events from XC for a given tenant.
@@ -81,8 +101,6 @@ def main() -> None:
     Returns:
         None
   """
-  DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
-
   args = args_parser()
 
   # Use the provided arguments or default values
@@ -92,91 +110,141 @@ def main() -> None:
   skip_days: int = args.skip_days or 0
   verbose: bool = args.verbose
 
+  # Verbose output is emitted through logging at DEBUG level, only by this tool's modules and not
+  # by the libraries (urllib3 connection pool and retries)
+  logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stdout)
+  if verbose:
+    for logger_name in ('XC', 'utils'):
+      logging.getLogger(logger_name).setLevel(logging.DEBUG)
+
   # Generate dates
-  start_time = args.from_date or (datetime.utcnow() - timedelta(hours=24 * previous_days))
-  end_time = args.to_date or (datetime.utcnow() - timedelta(hours=24 * skip_days))
+  now = datetime.now(timezone.utc)
+  start_time = args.from_date or (now - timedelta(hours=24 * previous_days))
+  end_time = args.to_date or (now - timedelta(hours=24 * skip_days))
+
+  # The cache validity can be changed with the F5XC_CACHE_TTL environment variable (seconds)
+  cache_ttl = 0
+  if not args.no_cache:
+    env_cache_ttl = os.environ.get('F5XC_CACHE_TTL', str(CACHE_TTL))
+    if not env_cache_ttl.strip().isdigit():
+      print(f"Invalid F5XC_CACHE_TTL value '{env_cache_ttl}', should be a number of seconds (0 disables the cache). Exiting...")
+      exit_script(1)
+    cache_ttl = int(env_cache_ttl)
 
   # Create XC object
   try:
-    xc = XC(args.tenant, args.namespace, args.api_key, args.loadbalancer, start_time, end_time, args.limit_events)
+    xc = XC(args.tenant, args.namespace, args.api_key, args.loadbalancer, start_time, end_time, args.limit_events,
+            cache_ttl)
   except (ValueError, Exception) as e:
     print(e)
     exit_script(1)
 
-  # Print summary
-  print("XC Security Data Extraction")
-  print(f"Extract security events from XC for tenant: {xc.tenant}")
-  print(f"Namespace: {xc.namespace}")
-  print(f"Load Balancer: {xc.loadbalancer_name}")
-  print(f"Extract events from: {xc.get_start_date_datetime():%d/%m/%Y %H:%M:%S}")
-  print(f"Extract events to  : {xc.get_to_date_datetime():%d/%m/%Y %H:%M:%S}")
-  print("Limit events to extract: {}".format(xc.limit_events if xc.limit_events > 0 else "No limit"))
-  print(f"Output file name: {OUTPUT_FILE}")
-  print(f"\n### START SCRIPT: {datetime.now():%d/%m/%Y %H:%M:%S} ###\n")
-
-  # Execute API calls to retrieve LBs
-  lbs = xc.get_all_loadbalancers(verbose)
-  if len(lbs) == 0:
-    print(f"No LBs found for tenant: {xc.tenant}\nExiting...")
-    exit_script(1)
-
-  vh_name = xc.get_virtual_hostname(lbs, verbose)
-  if len(vh_name) == 0:
-    print(f"No VHs found for tenant: {xc.tenant}\nExiting...")
-    exit_script(1)
-
-  lb_names = [lb['name'] for lb in lbs]
-
-  print(f"Requested LBs: {', '.join(lb_names)}")
-  print(f"Requested VHs with security policy: {', '.join(vh_name)}")
-
-  if verbose:
-    print(f"Load Balancers list: {json.dumps(lbs, indent=2)}")
-
-  print("\n")
-
-  obj_events = {}
-  for vh in vh_name:
-    print(f"Request events for LB: {vh}")
-    with recursion_depth(RECUSION_LIMIT):
-      obj_events[vh] = xc.get_security_events(vh, 0, None, verbose)
-
-  if len(obj_events) == 0:
-    print(f"No events found for tenant: {xc.tenant}\nExiting...")
-    exit_script(1)
-
-  # Finish collecting data - Start Write to file
-
-  supported_event_types = {'waf_sec_event', 'bot_defense_sec_event', 'api_sec_event', 'svc_policy_sec_event'}
-  obj_events_saved = {event_type: [] for event_type in supported_event_types}
-
-  # Select only supported event types - Separate in different lists
-  for _, events in obj_events.items():
-    for event in events:
-      event_type = event['sec_event_type']
-      if event_type not in supported_event_types:
-        print(f"Event type {event_type} not supported")
-        break
-      obj_events_saved[event_type].append(event)
-
-  print("\n")
-  for key, value in obj_events_saved.items():
-    print(f"Extracted events with type {key}: {utils.get_string_number(len(value))}")
-  print("\n")
+  with xc:
+    # Print summary
+    print("XC Security Data Extraction")
+    print(f"Extract security events from XC for tenant: {xc.tenant}")
+    print(f"Namespace: {xc.namespace}")
+    print(f"Load Balancer: {xc.loadbalancer_name}")
+    print(f"Extract events from: {xc.get_start_date_datetime():%d/%m/%Y %H:%M:%S}")
+    print(f"Extract events to  : {xc.get_to_date_datetime():%d/%m/%Y %H:%M:%S}")
+    print("Limit events to extract: {}".format(xc.limit_events if xc.limit_events > 0 else "No limit"))
+    print(f"Output file name: {OUTPUT_FILE}")
+    print(f"\n### START SCRIPT: {datetime.now():%d/%m/%Y %H:%M:%S} ###\n")
+
+    # Execute API calls to retrieve LBs
+    lbs = xc.get_all_loadbalancers()
+    if len(lbs) == 0:
+      print(f"No LBs found for tenant: {xc.tenant}\nExiting...")
+      exit_script(1)
+
+    vh_name = xc.get_virtual_hostname(lbs)
+    if len(vh_name) == 0:
+      print(f"No VHs found for tenant: {xc.tenant}\nExiting...")
+      exit_script(1)
+
+    lb_names = [lb['name'] for lb in lbs]
+
+    print(f"Requested LBs: {', '.join(lb_names)}")
+    print(f"Requested VHs with security policy: {', '.join(vh_name)}")
+
+    if verbose:
+      print(f"Load Balancers list: {json.dumps(lbs, indent=2)}")
+
+    print("\n")
+
+    # The same types the XC query is filtered on
+    supported_event_types = SEC_EVENT_TYPES
+
+    # Each LB has its own scroll chain, extract them in parallel
+    # Events are separated by type as soon as each LB is completed and spooled to disk, so only the LBs
+    # being extracted are kept in memory
+    for vh in vh_name:
+      print(f"Request events for LB: {vh}")
+    with tempfile.TemporaryDirectory(prefix='f5xc-') as spool_dir:
+      spooled_events = {}
+      events_count = dict.fromkeys(supported_event_types, 0)
+      for vh, events in xc.get_security_events_for_lbs(vh_name, args.workers, args.windows):
+        spooled_events[vh] = {}
+        for event_type, type_events in classify_events(events, supported_event_types).items():
+          if type_events:
+            spooled_events[vh][event_type] = utils.spool_events(type_events, spool_dir)
+            events_count[event_type] += len(type_events)
+
+      # Finish collecting data - Start Write to file
+
+      # Read the events of each type back in the LBs order
+      obj_events_saved = {
+        event_type: utils.SpooledEvents(
+          [spooled_events[vh][event_type] for vh in vh_name if event_type in spooled_events[vh]],
+          events_count[event_type])
+        for event_type in supported_event_types
+      }
+
+      print("\n")
+      for key, value in obj_events_saved.items():
+        print(f"Extracted events with type {key}: {utils.get_string_number(len(value))}")
+      print("\n")
+
+      if all(len(lst) == 0 for lst in obj_events_saved.values()):
+        print(f"No events found for tenant: {xc.tenant}\nExiting...")
+        exit_script(1)
+
+      print(f"Save data in file: {OUTPUT_FILE}")
+      if IS_JSON:
+        resultSave = utils.saveToJSON(obj_events_saved, OUTPUT_FILE)
+      else:
+        resultSave = utils.saveToExcel(obj_events_saved, OUTPUT_FILE)
+
+      if not resultSave:
+        exit_script(1)
+      # Keep the partial data, but do not report a complete extraction
+      if xc.incomplete_lbs:
+        print(f"Data saved, but the events are incomplete for LBs: {', '.join(xc.incomplete_lbs)}")
+        exit_script(1)
+      print("Data saved successfully!")
+      exit_script()
+
+
+def positive_int(value: str) -> int:
+  """
+  Parse a CLI argument as a positive integer.
 
-  if all(len(lst) == 0 for lst in obj_events_saved.values()):
-    print(f"No events found for tenant: {xc.tenant}\nExiting...")
-    exit_script(1)
+  Args:
+      value (str): The argument value.
 
-  print(f"Save data in file: {OUTPUT_FILE}")
-  if IS_JSON:
-    resultSave = utils.saveToJSON(obj_events_saved, OUTPUT_FILE)
-  else:
-    resultSave = utils.saveToExcel(obj_events_saved, OUTPUT_FILE)
+  Returns:
+      int: The parsed value.
 
-  if resultSave:
-    print("Data saved successfully!")
-    exit_script()
+  Raises:
+      argparse.ArgumentTypeError: If the value is not an integer greater than 0.
+  """
+  try:
+    number = int(value)
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+  if number < 1:
+    raise argparse.ArgumentTypeError(f"must be a positive integer: '{value}'")
+  return number
 
 
 def args_parser() -> object:
@@ -213,13 +281,26 @@ def args_parser() -> object:
                       help='From date in format YYYY-MM-DD[THH:MM:SS]')
   parser.add_argument('-T', '--to-date', type=str,
                       help='To date in format YYYY-MM-DD[THH:MM:SS]')
+  parser.add_argument('-w', '--workers', type=positive_int, default=8,
+                      help='Number of load balancers to extract in parallel (Default: 8)')
+  parser.add_argument('--windows', type=positive_int, default=1,
+                      help='Split the time range of each load balancer in this number of windows extracted in parallel, not with --limit-events (Default: 1)')
+  parser.add_argument('--no-cache', action='store_true',
+                      help='Do not use the cached load balancers and virtual hostnames (Default: cached for 10 minutes)')
   parser.add_argument('-v', '--verbose', action='store_true', help='Verbose mode')
   parser.add_argument('--version', action='version', help='Show version',
                       version='F5 XC Security Event Logs Extraction 1.0.0 - By: @gelmistefano')
 
   # Parse the arguments from CLI
-  return parser.parse_args()
+  args = parser.parse_args()
+
+  # Each window would apply the limit on its own, so the limited events would depend on the windows
+  if args.windows > 1 and args.limit_events:
+    parser.error('argument --windows: cannot be used with -L/--limit-events')
+
+  return args
 
 
 # Main function
-main()
+if __name__ == '__main__':
+  main()
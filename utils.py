@@ -1,9 +1,271 @@
 import requests
 import json
+import logging
 import os
-from pandas import ExcelWriter, DataFrame
+import time
+import hashlib
+import random
+import socket
+import tempfile
+import orjson
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Iterator, Mapping
+from xlsxwriter import Workbook
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.connection import HTTPConnection
+
+SESSION_HEADERS = {'accept': 'application/json', 'Cache-Control': 'no-cache'}
+HEADERS = {'Authorization': 'APIToken', **SESSION_HEADERS}
+
+
+class _JitterRetry(Retry):
+  """
+  Retry policy adding a random jitter to the exponential backoff, so the parallel workers throttled at
+  the same time do not retry in lockstep. Waits requested by a Retry-After header are not changed.
+  """
+
+  # Maximum extra wait, as a fraction of the exponential backoff
+  BACKOFF_JITTER = 0.5
+
+  def get_backoff_time(self) -> float:
+    return super().get_backoff_time() * (1 + random.random() * self.BACKOFF_JITTER)
+
+
+# The XC API calls are read-only queries, so POST requests are retried as well
+RETRY_POLICY = _JitterRetry(
+  total=5,
+  backoff_factor=0.5,
+  status_forcelist=(429, 500, 502, 503, 504),
+  allowed_methods=frozenset(['GET', 'POST']),
+  raise_on_status=False,
+  respect_retry_after_header=True
+)
+# A scroll request that timed out, lost its connection or failed behind a gateway (500, 502, 504) may have
+# already advanced the server-side cursor, retrying it would silently skip a page. Only connect errors and
+# the statuses of requests rejected before being processed (429, 503) are retried.
+SCROLL_RETRY_POLICY = RETRY_POLICY.new(read=0, status_forcelist=(429, 503))
+
+# Connect and read timeouts (seconds) of each request, so a stalled endpoint cannot hang the extraction.
+# The read timeout is a generous upper bound for the first page, which runs the query on the whole range.
+REQUEST_TIMEOUT = (5, 120)
+# TCP keepalive probes keep the idle pooled connections from being dropped by middleboxes
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] + [
+  (socket.IPPROTO_TCP, getattr(socket, name), value)
+  for name, value in (('TCP_KEEPIDLE', 30), ('TCP_KEEPINTVL', 10), ('TCP_KEEPCNT', 3))
+  if hasattr(socket, name)
+]
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'f5xc')
+CACHE_MAX_ENTRIES = 100
+# Only the beginning of the response body is logged in verbose mode, the scroll pages can be several MB
+VERBOSE_BODY_BYTES = 512
+# Maximum number of rows of an Excel sheet
+EXCEL_MAX_ROWS = 1_048_576
+# The output and spool files are written one event at a time, a large buffer keeps the write calls few
+WRITE_BUFFER_SIZE = 1 << 20
+
+log = logging.getLogger(__name__)
+
+
+class _KeepAliveAdapter(HTTPAdapter):
+  """
+  HTTPAdapter opening its connections with KEEPALIVE_SOCKET_OPTIONS.
+  """
+
+  def init_poolmanager(self, *args, **kwargs):
+    kwargs['socket_options'] = KEEPALIVE_SOCKET_OPTIONS
+    super().init_poolmanager(*args, **kwargs)
+
+
+def _create_adapter(pool_maxsize: int, retry: Retry) -> HTTPAdapter:
+  """
+  Create the HTTPAdapter of a session created by create_session().
+
+  Parameters:
+  - pool_maxsize (int): The maximum number of connections kept to the tenant.
+  - retry (Retry): The retry policy of the requests.
+
+  Returns:
+  - HTTPAdapter: The configured adapter.
+  """
+  return _KeepAliveAdapter(
+    pool_connections=1,
+    pool_maxsize=pool_maxsize,
+    pool_block=True,
+    max_retries=retry
+  )
+
+
+def create_session(pool_maxsize: int = 16) -> requests.Session:
+  """
+  Create a requests Session with connection pooling and retries for the XC API.
+
+  Reusing the same Session keeps the TCP/TLS connection to the tenant alive between calls, so the
+  scroll pagination does not pay a new handshake for every page. The pool blocks when all its
+  connections are busy, so concurrent callers share at most pool_maxsize keep-alive connections
+  instead of opening extra ones that would be discarded after a single request. Transient errors
+  are retried with an exponential backoff following RETRY_POLICY, so a single failed request
+  does not end the extraction of its load balancer (see SCROLL_RETRY_POLICY for the scroll pages). TCP keepalive is enabled on the pooled connections.
+
+  Parameters:
+  - pool_maxsize (int, optional): The maximum number of connections kept to the tenant. Defaults to 16.
+
+  Returns:
+  - requests.Session: The configured session.
+  """
+  session = requests.Session()
+  session.headers.update(SESSION_HEADERS)
+  session.mount('https://', _create_adapter(pool_maxsize, RETRY_POLICY))
+  return session
+
+
+def mount_scroll_adapter(session: requests.Session, url_prefix: str, pool_maxsize: int = 16) -> None:
+  """
+  Send the requests starting with url_prefix with SCROLL_RETRY_POLICY, which never retries a read error.
+
+  The session holds a single scroll adapter: when the prefix changes, the adapter mounted by the previous
+  call is moved to the new prefix with its pooled connections, instead of mounting one more adapter.
+
+  Parameters:
+  - session (requests.Session): A session created by create_session().
+  - url_prefix (str): The URL prefix of the scroll requests.
+  - pool_maxsize (int, optional): The maximum number of connections kept for the scroll requests. Defaults to 16.
+  """
+  adapter = None
+  for prefix in [prefix for prefix, mounted in session.adapters.items() if mounted.max_retries is SCROLL_RETRY_POLICY]:
+    adapter = session.adapters.pop(prefix)
+  session.mount(url_prefix, adapter or _create_adapter(pool_maxsize, SCROLL_RETRY_POLICY))
+
+
+@lru_cache(maxsize=8)
+def _request_headers(api_key: str, with_session: bool, content_type: str | None = None) -> Mapping[str, str]:
+  """
+  Build the headers to send with a single request.
+
+  A session created by create_session() already carries SESSION_HEADERS, so only the Authorization
+  header is sent per request. Without a session, the full HEADERS are sent. The headers are built once
+  per API key and cached, and returned as a read-only mapping shared by all the requests.
+
+  Parameters:
+  - api_key (str): The API key to use for authentication.
+  - with_session (bool): Whether the request is sent with a session created by create_session().
+  - content_type (str | None, optional): The Content-Type header of the request body. Defaults to None.
+
+  Returns:
+  - Mapping[str, str]: The request headers.
+  """
+  headers = {'Authorization': f'APIToken {api_key}'} if with_session else {**HEADERS, 'Authorization': f'APIToken {api_key}'}
+  if content_type is not None:
+    headers['Content-Type'] = content_type
+  return MappingProxyType(headers)
+
+
+@lru_cache(maxsize=8)
+def _headers_to_json(api_key: str, with_session: bool, content_type: str | None = None) -> str:
+  """
+  Pretty-print the request headers for verbose mode, caching the result since the headers rarely change.
+
+  Parameters:
+  - api_key (str): The API key to use for authentication.
+  - with_session (bool): Whether the request is sent with a session created by create_session().
+  - content_type (str | None, optional): The Content-Type header of the request body. Defaults to None.
+
+  Returns:
+  - str: The headers as indented JSON.
+  """
+  return json.dumps(dict(_request_headers(api_key, with_session, content_type)), indent=2)
+
+
+def _cache_path(key: str) -> str:
+  """
+  Get the path of the cache file for the provided key. The key is hashed, so it can contain secrets.
+
+  Parameters:
+  - key (str): The cache key.
+
+  Returns:
+  - str: The path of the cache file.
+  """
+  return os.path.join(CACHE_DIR, f'{hashlib.sha256(key.encode()).hexdigest()}.json')
+
+
+def load_cache(key: str, ttl: int) -> object | None:
+  """
+  Load a value from the disk cache if it is younger than ttl seconds.
 
-HEADERS = {'Authorization': 'APIToken', 'accept': 'application/json', 'Cache-Control': 'no-cache'}
+  The file modification time is the time the value was saved, while the access time is updated on
+  each hit to keep track of the least recently used entries.
+
+  Parameters:
+  - key (str): The cache key.
+  - ttl (int): The cache validity in seconds. 0 disables the cache.
+
+  Returns:
+  - object | None: The cached value, or None if it is missing, expired or the cache is disabled.
+  """
+  if ttl <= 0:
+    return None
+  file_path = _cache_path(key)
+  try:
+    now = time.time()
+    saved_at = os.path.getmtime(file_path)
+    if now - saved_at >= ttl:
+      return None
+    with open(file_path, 'rb') as file:
+      value = orjson.loads(file.read())
+    os.utime(file_path, (now, saved_at))
+    return value
+  except (OSError, ValueError):
+    return None
+
+
+def save_cache(key: str, value: object) -> None:
+  """
+  Save a value in the disk cache, removing the least recently used entries beyond CACHE_MAX_ENTRIES.
+
+  The cache holds tenant data, so the directory is only accessible by the current user (0o700) and the
+  files are created with 0o600 permissions. Each file is written to a temporary file and then renamed,
+  so a concurrent run never reads a partial entry.
+
+  Parameters:
+  - key (str): The cache key.
+  - value (object): The JSON serializable value to cache.
+  """
+  try:
+    os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+    os.chmod(CACHE_DIR, 0o700)
+    # mkstemp creates the file with 0o600 permissions
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=CACHE_DIR)
+    try:
+      with os.fdopen(fd, 'wb') as file:
+        file.write(orjson.dumps(value))
+      os.replace(tmp_path, _cache_path(key))
+    except BaseException:
+      os.remove(tmp_path)
+      raise
+    _prune_cache(CACHE_MAX_ENTRIES)
+  except OSError as e:
+    print(f"Error saving cache: {e}")
+
+
+def _prune_cache(max_entries: int) -> None:
+  """
+  Remove the least recently used cache files, keeping at most max_entries.
+
+  Parameters:
+  - max_entries (int): The number of cache files to keep.
+  """
+  entries = [entry for entry in os.scandir(CACHE_DIR) if entry.is_file() and entry.name.endswith('.json')]
+  if len(entries) <= max_entries:
+    return
+  entries.sort(key=lambda entry: entry.stat().st_atime)
+  for entry in entries[:len(entries) - max_entries]:
+    try:
+      os.remove(entry.path)
+    except OSError:
+      pass
 
 
 def get_string_number(number: int) -> str:
@@ -37,7 +299,7 @@ def get_string_number(number: int) -> str:
   """
   if number >= 1_000_000_000:
     formatted_number = f"{number/1_000_000_000:.1f}b"
-  if number >= 1_000_000:
+  elif number >= 1_000_000:
     formatted_number = f"{number/1_000_000:.1f}m"
   elif number >= 1_000:
     formatted_number = f"{number/1_000:.1f}k"
@@ -47,33 +309,113 @@ def get_string_number(number: int) -> str:
   return formatted_number
 
 
-def saveToJSON(data: list, outputfile: str) -> bool:
+def spool_events(events: list, directory: str) -> str:
+  """
+  Write events to a new NDJSON file, so they do not have to be kept in memory until the output is saved.
+
+  Parameters:
+  - events (list): The events to write.
+  - directory (str): The directory where the file is created.
+
+  Returns:
+  - str: The path of the created file.
+  """
+  fd, file_path = tempfile.mkstemp(suffix='.ndjson', dir=directory)
+  with os.fdopen(fd, 'wb', buffering=WRITE_BUFFER_SIZE) as file:
+    for event in events:
+      file.write(orjson.dumps(event, option=orjson.OPT_APPEND_NEWLINE))
+  return file_path
+
+
+class SpooledEvents:
+  """
+  Events written by spool_events(), read back one at a time in the order of the files.
+
+  The events can be iterated more than once, and len() returns their number without reading the files.
+  """
+
+  __slots__ = ('_paths', '_count')
+
+  def __init__(self, paths: list, count: int):
+    """
+    Parameters:
+    - paths (list): The NDJSON files, in the order their events are read.
+    - count (int): The total number of events in the files.
+    """
+    self._paths = paths
+    self._count = count
+
+  def __len__(self) -> int:
+    return self._count
+
+  def __iter__(self) -> Iterator[dict]:
+    for file_path in self._paths:
+      with open(file_path, 'rb') as file:
+        for line in file:
+          yield orjson.loads(line)
+
+
+def saveToJSON(data: dict, outputfile: str) -> bool:
   """
-  Save a list to a JSON file.
+  Save the events of each type to a JSON file.
+
+  The events are written one at a time, so they can be read from a SpooledEvents without loading them in memory.
 
   Parameters:
-  - data: The list to be saved.
+  - data (dict): The events (list or SpooledEvents) of each event type.
   - outputfile: The path to the JSON file.
 
   Returns:
-  - bool: True if the list was successfully saved to the file, False otherwise.
+  - bool: True if the data was successfully saved to the file, False otherwise.
   """
   try:
     file_path = os.path.join(os.getcwd(), outputfile)
-    with open(file_path, 'w') as file:
-      json.dump(data, file)
+    with open(file_path, 'wb', buffering=WRITE_BUFFER_SIZE) as file:
+      file.write(b'{')
+      for index, (event_type, events) in enumerate(data.items()):
+        if index:
+          file.write(b',')
+        file.write(orjson.dumps(event_type))
+        file.write(b':[')
+        for event_index, event in enumerate(events):
+          if event_index:
+            file.write(b',')
+          file.write(orjson.dumps(event))
+        file.write(b']')
+      file.write(b'}')
     return True
   except Exception as e:
     print(f"Error saving list to JSON file: {e}")
     return False
 
 
+def _excel_value(value):
+  """
+  Convert an event value to a value that can be written in an Excel cell.
+
+  Nested values (dicts, lists) are written as their string representation, like pandas does.
+
+  Parameters:
+  - value: The event value.
+
+  Returns:
+  - The value to write in the cell.
+  """
+  if value is None or isinstance(value, (str, int, float)):
+    return value
+  return str(value)
+
+
 def saveToExcel(data: dict, outputfile: str) -> bool:
   """
     Save the data to an Excel file.
 
+    Each sheet is written row by row with xlsxwriter in constant memory mode, so the rows are flushed
+    to disk while writing instead of building a DataFrame and a full workbook in memory. Event values are
+    always written as text, never as formulas or URLs, since they can contain attacker-controlled strings.
+
     Parameters:
-    - data (dict): A dictionary containing event data for different event types.
+    - data (dict): The events (list or SpooledEvents) of each event type. The events are read twice, to find the columns and to write the rows.
 
     Returns:
     - bool: True if the data is successfully saved, False otherwise.
@@ -83,34 +425,72 @@ def saveToExcel(data: dict, outputfile: str) -> bool:
   """
 
   try:
-      # Create a writer for the Excel file
-    writer = ExcelWriter(outputfile)
+    # A sheet holds at most EXCEL_MAX_ROWS rows, including the header
+    for sheet, events in data.items():
+      if len(events) >= EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(events)} {sheet} events do not fit in an Excel sheet, use the JSON output (-j)")
+
+    # Create the Excel file
+    workbook = Workbook(outputfile, {'constant_memory': True, 'strings_to_urls': False, 'strings_to_formulas': False})
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
 
     for sheet, events in data.items():
-      # Create a DataFrame for each sheet
-      df = DataFrame(events)
+      worksheet = workbook.add_worksheet(sheet)
+
+      # Columns in the order they are first found in the events
+      columns = list(dict.fromkeys(key for event in events for key in event))
+      if worksheet.write_row(0, 0, columns, header_format) == -1:
+        raise ValueError(f"{len(columns)} {sheet} columns do not fit in an Excel sheet, use the JSON output (-j)")
+
+      # Write each event as a row of the sheet, cell by cell since write_row stops at the first truncated value
+      truncated = 0
+      for row, event in enumerate(events, start=1):
+        for col, column in enumerate(columns):
+          if worksheet.write(row, col, _excel_value(event.get(column))) == -2:
+            truncated += 1
 
-      # Write the DataFrame to the sheet in the Excel file
-      df.to_excel(writer, sheet_name=sheet, index=False)
+      # A cell holds at most 32767 characters, longer values are cut by xlsxwriter
+      if truncated:
+        print(f"Warning: {truncated} {sheet} values longer than 32767 characters were truncated, use the JSON output (-j) for the full values")
 
     # Save the Excel file
-    writer.close()
+    workbook.close()
 
     return True
 
   except Exception as e:
-    print(f"Error Pandas Exception: {e}")
+    print(f"Error Excel Exception: {e}")
     return False
 
 
-def send_get_request(url: str, api_key: str, verbose: bool) -> dict:
+def _decode_json_response(response: requests.Response) -> dict:
+  """
+  Parse the JSON body of an API response.
+
+  Parameters:
+  - response (requests.Response): The API response.
+
+  Returns:
+  - dict: The response data parsed as a dictionary.
+
+  Raises:
+  - ValueError: If the response is not JSON (e.g. an HTML error or login page) or cannot be parsed.
+  """
+  # Fail fast on error pages instead of trying to parse them
+  content_type = response.headers.get('Content-Type')
+  if content_type is not None and 'json' not in content_type.lower():
+    raise ValueError(f"Non-JSON response ({content_type}): {response.content[:200]!r}")
+  return orjson.loads(response.content)
+
+
+def send_get_request(url: str, api_key: str, *, session: requests.Session | None = None) -> dict:
   """
   Sends a GET request to the specified URL and returns the response data as a dictionary.
 
   Parameters:
   - url (str): The URL to send the GET request to.
   - api_key (str): The API key to use for authentication.
-  - verbose (bool): Whether to print details about the API call.
+  - session (requests.Session | None, optional): The session to send the request with, keyword-only. Defaults to None (no connection reuse).
 
   Returns:
   - dict: The response data parsed as a dictionary.
@@ -122,8 +502,7 @@ def send_get_request(url: str, api_key: str, verbose: bool) -> dict:
 
   This function sends a GET request to the provided URL using the requests library. It includes
   the HEADERS in the request for any necessary authentication or headers required by the API.
-  If the VERBOSE flag is enabled, it prints details about the API call, including the request URL
-  and headers.
+  The details about the API call, including the request URL and headers, are logged at DEBUG level.
 
   If the request is successful (returns a 200 status code), the response content is parsed as JSON
   and returned as a dictionary.
@@ -132,23 +511,24 @@ def send_get_request(url: str, api_key: str, verbose: bool) -> dict:
   an exception is raised. 
   """
 
-  headers = HEADERS.copy()
-  headers.update({'Authorization': f'APIToken {api_key}'})
+  with_session = session is not None
+  headers = _request_headers(api_key, with_session)
 
-  # Print API call details if verbose mode is enabled
+  # Log API call details, the formatting only happens in verbose mode
+  verbose = log.isEnabledFor(logging.DEBUG)
+  log.debug("Request URL: %s", url)
   if verbose:
-    print(f"Request URL: {url}")
-    print(f"Request headers: {json.dumps(headers, indent=2)}")
+    log.debug("Request headers: %s", _headers_to_json(api_key, with_session))
 
   try:
-    response_lb = requests.get(url, headers=headers)
-    # Print response details if verbose mode is enabled
+    response_lb = (session or requests).get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    log.debug("Response code: %s", response_lb.status_code)
     if verbose:
-      print(f"Response code: {response_lb.status_code}")
-      print(f"Response content: {response_lb.text}")
+      log.debug("Response content (%d bytes): %s", len(response_lb.content),
+                response_lb.content[:VERBOSE_BODY_BYTES].decode(errors='replace'))
 
     response_lb.raise_for_status()  # Raise an exception for non-200 status codes
-    data = response_lb.json()  # Parse the JSON response
+    data = _decode_json_response(response_lb)  # Parse the JSON response
 
     return data
 
@@ -157,7 +537,7 @@ def send_get_request(url: str, api_key: str, verbose: bool) -> dict:
     raise
 
 
-def send_post_request(url: str, requestBody: dict, api_key: str, verbose: bool) -> dict:
+def send_post_request(url: str, requestBody: dict, api_key: str, *, session: requests.Session | None = None) -> dict:
   """
   Sends a POST request to the specified XC URL with the provided request body and returns the response data as a dictionary.
 
@@ -165,7 +545,7 @@ def send_post_request(url: str, requestBody: dict, api_key: str, verbose: bool)
   - url (str): The URL to send the POST request to.
   - requestBody (dict): The request body as a dictionary.
   - api_key (str): The API key to use for authentication.
-  - verbose (bool): Whether to print details about the API call.
+  - session (requests.Session | None, optional): The session to send the request with, keyword-only. Defaults to None (no connection reuse).
 
   Returns:
   - dict: The response data parsed as a dictionary.
@@ -175,9 +555,9 @@ def send_post_request(url: str, requestBody: dict, api_key: str, verbose: bool)
   - ValueError: If the response content cannot be parsed as JSON.
   - Exception: If an unexpected error occurs.
 
-  This function sends a POST request to the provided URL using the requests library. It includes the HEADERS in the request for any necessary authentication or headers required by the API. The request body is sent as JSON using the json parameter of the requests.post() method.
+  This function sends a POST request to the provided URL using the requests library. It includes the HEADERS in the request for any necessary authentication or headers required by the API. The request body is serialized to JSON with orjson and sent as the raw data of the requests.post() method.
 
-  If the VERBOSE flag is enabled, it prints details about the API call, including the request URL, headers, and body.
+  The details about the API call, including the request URL, headers, and body, are logged at DEBUG level.
 
   If the request is successful (returns a 200 status code), the response content is parsed as JSON and returned as a dictionary.
 
@@ -190,27 +570,27 @@ def send_post_request(url: str, requestBody: dict, api_key: str, verbose: bool)
   {'response_key': 'response_value'}
   """
 
-  headers = HEADERS.copy()
-  headers.update({'Authorization': f'APIToken {api_key}'})
-  headers.update({'Content-type': 'application/json'})
+  with_session = session is not None
+  headers = _request_headers(api_key, with_session, 'application/json')
 
-  # Print API call details if verbose mode is enabled
+  # Log API call details, the formatting only happens in verbose mode
+  verbose = log.isEnabledFor(logging.DEBUG)
+  log.debug("Request URL: %s", url)
   if verbose:
-    print(f"Request URL: {url}")
-    print(f"Request headers: {json.dumps(headers, indent=2)}")
-    print(f"Request body: {json.dumps(requestBody, indent=2)}")
+    log.debug("Request headers: %s", _headers_to_json(api_key, with_session, 'application/json'))
+    log.debug("Request body: %s", json.dumps(requestBody, indent=2))
 
   try:
     # Make the API request
-    response = requests.post(url, headers=headers, json=requestBody)
+    response = (session or requests).post(url, headers=headers, data=orjson.dumps(requestBody), timeout=REQUEST_TIMEOUT)
 
-    # Print response details if verbose mode is enabled
+    log.debug("Response code: %s", response.status_code)
     if verbose:
-      print(f"Response code: {response.status_code}")
-      print(f"Response content: {response.text}")
+      log.debug("Response content (%d bytes): %s", len(response.content),
+                response.content[:VERBOSE_BODY_BYTES].decode(errors='replace'))
 
     response.raise_for_status()  # Raise an exception for non-200 status codes
-    data = response.json()
+    data = _decode_json_response(response)
 
     return data
 